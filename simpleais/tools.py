@@ -1,14 +1,16 @@
-import functools
+import itertools
 import logging
 import math
 import os
-import re
 import sys
-from collections import defaultdict
+from array import array
+from collections import defaultdict, OrderedDict
 from contextlib import contextmanager
-from copy import copy
+from functools import lru_cache
 from math import radians, sin, atan2, sqrt, cos
+from stat import S_ISREG
 from time import localtime
+from time import monotonic
 from time import strftime
 
 import click
@@ -18,6 +20,9 @@ from dateutil.parser import parse as dateutil_parse
 from simpleais import sentences_from_source
 
 _RADIUS_OF_EARTH = 6373.0
+_BURST_BUFFER_SIZE = 1 << 16  # with the open writer cap, at most 32 MiB waiting to be written
+_BURST_MAX_OPEN_WRITERS = 512
+_TIME_FORMAT = "%Y/%m/%d %H:%M:%S"
 
 
 @contextmanager
@@ -29,7 +34,62 @@ def wild_disregard_for(e):
 
 
 def time_to_text(t):
-    return strftime("%Y/%m/%d %H:%M:%S", localtime(t))
+    if t is None:
+        return strftime(_TIME_FORMAT, localtime())
+    return _second_to_text(math.floor(t))
+
+
+# neighboring sentences usually arrive within the same second, so remembering the last one saves most calls
+@lru_cache(maxsize=1)
+def _second_to_text(second):
+    return strftime(_TIME_FORMAT, localtime(second))
+
+
+class LineBatcher:
+    """
+    Prints lines to stdout. A terminal or a live source gets each line right away; otherwise
+    we flush every so many lines or seconds, which saves a write() call per line.
+    """
+
+    def __init__(self, lines_per_flush=64, seconds_per_flush=1.0):
+        self.lines_per_flush = lines_per_flush
+        self.seconds_per_flush = seconds_per_flush
+        self.live = False
+        self.stream = None
+        self.interactive = False
+        self.pending = 0
+        self.last_flush = monotonic()
+
+    def print(self, line):
+        stream = sys.stdout
+        if stream is not self.stream:
+            self.stream = stream
+            self.interactive = stream.isatty()
+            self.pending = 0
+        print(line, file=stream)
+        self.pending += 1
+        if self.interactive or self.live or self.pending >= self.lines_per_flush or \
+                monotonic() - self.last_flush >= self.seconds_per_flush:
+            self.flush()
+
+    def flush(self):
+        if self.stream is not None and self.pending > 0:
+            self.stream.flush()
+            self.pending = 0
+        self.last_flush = monotonic()
+
+
+def sources_are_live(sources):
+    """True if sentences may trickle in, as from a serial port, a URL, or a pipe on stdin."""
+    if len(sources) > 0:
+        return any(source.startswith(("/dev/tty", "http://", "https://")) for source in sources)
+    try:
+        return not S_ISREG(os.fstat(sys.stdin.fileno()).st_mode)
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+_stdout_lines = LineBatcher()
 
 
 def print_sentence_source(sentence, file=None):
@@ -43,23 +103,21 @@ def print_sentence_source(sentence, file=None):
             output = line
 
         if file:
-            print(output, file=file)
+            file.write(output)
+            file.write("\n")
         else:
-            # noinspection PyArgumentList
-            print(output, flush=True)
+            _stdout_lines.print(output)
 
 
 def sentences_from_sources(sources, log_errors=False):
     if len(sources) > 0:
         for source in sources:
             try:
-                for sentence in sentences_from_source(source, log_errors):
-                    yield sentence
+                yield from sentences_from_source(source, log_errors)
             except:
                 logging.exception("Unexpected failure with source {}; continuing".format(source))
     else:
-        for sentence in sentences_from_source(sys.stdin, log_errors):
-            yield sentence
+        yield from sentences_from_source(sys.stdin, log_errors)
 
 
 @click.command()
@@ -67,9 +125,12 @@ def sentences_from_sources(sources, log_errors=False):
 @click.option('--verbose', is_flag=True)
 def cat(sources, verbose):
     """ Prints out all complete AIS transmissions.  """
+    _stdout_lines.live = sources_are_live(sources)
     for sentence in sentences_from_sources(sources, log_errors=verbose):
         with wild_disregard_for(BrokenPipeError):
             print_sentence_source(sentence)
+    with wild_disregard_for(BrokenPipeError):
+        _stdout_lines.flush()
 
 
 class Taster(object):
@@ -87,51 +148,84 @@ class Taster(object):
         self.before = before
         self.after = after
         if mode == 'and' or mode is None:
-            self.default_result = [True]
-            self.reducer = lambda x, y: x and y
+            self.combine = all
         elif mode == 'or':
-            self.default_result = [False]
-            self.reducer = lambda x, y: x or y
+            self.combine = any
         else:
             raise ValueError("unknown mode {}".format(mode))
         self.checksum = checksum
         self.invert_match = invert_match
+        self.checks = self._checks_wanted()
 
-    def likes(self, sentence):
-        factors = copy(self.default_result)
+    def _checks_wanted(self):
+        # decided once here so that likes() only runs the checks that matter, stopping at the first decisive one
+        checks = []
         if self.mmsi:
-            factors.append(sentence['mmsi'] in self.mmsi)
+            checks.append(self._mmsi_ok)
         if self.sentence_type:
-            factors.append(sentence.type_id() in self.sentence_type)
-        if self.vessel_class:
-            if self.vessel_class == 'a':
-                factors.append(sentence.type_id() in [1, 2, 3, 5])
-            elif self.vessel_class == 'b':
-                factors.append(sentence.type_id() in [18, 19, 24])
+            checks.append(self._type_ok)
+        if self.vessel_class == 'a':
+            checks.append(self._class_a_ok)
+        elif self.vessel_class == 'b':
+            checks.append(self._class_b_ok)
         if self.lon or self.lat:
-            loc = sentence.location()
-            if self.lon:
-                factors.append(loc is not None and self.lon[0] <= loc[0] <= self.lon[1])
-            if self.lat:
-                factors.append(loc is not None and self.lat[0] <= loc[1] <= self.lat[1])
+            checks.append(self._location_ok)
         if self.field:
-            for f in self.field:
-                factors.append(sentence[f] is not None)
+            checks.append(self._fields_ok)
         if self.value:
-            for f, v in self.value:
-                factors.append(sentence[f] == v or str(sentence[f]) == str(v))
+            checks.append(self._values_ok)
         if self.before:
-            factors.append(sentence.time <= self.before)
+            checks.append(self._before_ok)
         if self.after:
-            factors.append(self.after <= sentence.time)
+            checks.append(self._after_ok)
         if self.checksum is not None:
-            factors.append(sentence.check() == self.checksum)
-        result = functools.reduce(self.reducer, factors)
+            checks.append(self._checksum_ok)
+        return checks
+
+    def likes(self, sentence):
+        result = self.combine(check(sentence) for check in self.checks)
         if self.invert_match:
             return not result
         else:
             return result
 
+    def _mmsi_ok(self, sentence):
+        return sentence['mmsi'] in self.mmsi
+
+    def _type_ok(self, sentence):
+        return sentence.type_id() in self.sentence_type
+
+    def _class_a_ok(self, sentence):
+        return sentence.type_id() in [1, 2, 3, 5]
+
+    def _class_b_ok(self, sentence):
+        return sentence.type_id() in [18, 19, 24]
+
+    def _location_ok(self, sentence):
+        loc = sentence.location()
+        if loc is None:
+            return False
+        lon_ok = self.lon and self.lon[0] <= loc[0] <= self.lon[1]
+        lat_ok = self.lat and self.lat[0] <= loc[1] <= self.lat[1]
+        if self.lon and self.lat:
+            return self.combine((lon_ok, lat_ok))
+        return bool(lon_ok or lat_ok)
+
+    def _fields_ok(self, sentence):
+        return self.combine(sentence[f] is not None for f in self.field)
+
+    def _values_ok(self, sentence):
+        return self.combine(sentence[f] == v or str(sentence[f]) == str(v) for f, v in self.value)
+
+    def _before_ok(self, sentence):
+        return sentence.time <= self.before
+
+    def _after_ok(self, sentence):
+        return self.after <= sentence.time
+
+    def _checksum_ok(self, sentence):
+        return sentence.check() == self.checksum
+
 
 def parse_date(string):
     if string:
@@ -161,17 +255,17 @@ def grep(sources, mmsi=None, mmsi_file=None, sentence_type=None, vessel_class=No
          value=None, before=None, after=None, field=None, checksum=None,
          mode='and', invert_match=False, max=None, verbose=False):
     """ Filters AIS transmissions.  """
-    if not mmsi:
-        mmsi = frozenset()
     if mmsi_file:
+        mmsi = frozenset(itertools.chain(mmsi, read_mmsi_file(mmsi_file)))
+    else:
         mmsi = frozenset(mmsi)
-        mmsi = mmsi.union(read_mmsi_file(mmsi_file))
     if checksum is None:
         checksum_desire = None
     else:
         checksum_desire = checksum == "valid"
     taster = Taster(mmsi, sentence_type, vessel_class, lon, lat, field, value, parse_date(before), parse_date(after),
                     mode, checksum_desire, invert_match)
+    _stdout_lines.live = sources_are_live(sources)
     with wild_disregard_for(BrokenPipeError):
         matches = 0
         for sentence in sentences_from_sources(sources, log_errors=verbose):
@@ -180,11 +274,13 @@ def grep(sources, mmsi=None, mmsi_file=None, sentence_type=None, vessel_class=No
                 matches += 1
                 if max and matches >= max:
                     break
+        _stdout_lines.flush()
 
 
 def read_mmsi_file(mmsi_file):
     with open(mmsi_file, "r") as f:
-        return frozenset([l.strip() for l in f.readlines()])
+        for l in f:
+            yield l.strip()
 
 
 @click.command()
@@ -203,41 +299,40 @@ def text_for(sentence, raw=False):
     if sentence.time:
         t = sentence.time
         if raw:
-            result.append("{:.3f}".format(t))
+            result.append(f"{t:.3f}")
         else:
             result.append(time_to_text(t))
-    result.append("{:2}".format(sentence.type_id()))
-    result.append("{:9}".format(str(sentence['mmsi'])))
-    if sentence['dest_mmsi']:
-        result.append("-> {:9}".format(str(sentence['dest_mmsi'])))
+    result.append(f"{sentence.type_id():2}")
+    result.append(f"{str(sentence['mmsi']):9}")
+    dest_mmsi = sentence['dest_mmsi']
+    if dest_mmsi:
+        result.append(f"-> {str(dest_mmsi):9}")
     if sentence.type_id() == 21:
-        result.append("{}".format(sentence['name']))
+        result.append(f"{sentence['name']}")
     location = sentence.location()
     if location:
-        result.append("{:9.4f} {:9.4f}".format(location[0], location[1]))
+        result.append(f"{location[0]:9.4f} {location[1]:9.4f}")
         if sentence['speed'] and sentence['speed'] < 102.3:
-            result.append("{}kn".format(sentence['speed']))
+            result.append(f"{sentence['speed']}kn")
         if sentence['course'] and sentence['course'] < 360:
             if sentence['heading'] and sentence['heading'] < 360:
-                result.append("{}°/{}°".format(sentence['course'], sentence['heading']))
+                result.append(f"{sentence['course']}°/{sentence['heading']}°")
             else:
-                result.append("{}°".format(sentence['course']))
+                result.append(f"{sentence['course']}°")
 
     # ship info
     if sentence['shipname']:
         result.append(sentence['shipname'])
     if sentence['to_bow'] and sentence['to_bow'] > 0:
-        result.append("({})".format(dimensions_as_text(sentence)))
+        result.append(f"({dimensions_as_text(sentence)})")
     if sentence['destination']:
-        result.append("-> {}".format(sentence['destination']))
+        result.append(f"-> {sentence['destination']}")
         if sentence['minute'] and sentence['minute'] < 60:
-            result.append("at {}/{} {}:{:02d}".format(
-                sentence['month'], sentence['day'],
-                sentence['hour'], sentence['minute']))
+            result.append(f"at {sentence['month']}/{sentence['day']} {sentence['hour']}:{sentence['minute']:02d}")
     elif sentence.type_id() in [12, 14]:
-        result.append("{}".format(sentence['text']))
+        result.append(f"{sentence['text']}")
     elif sentence.type_id() == 24 and sentence['partno'] == 0:
-        result.append("{}".format(sentence['shipname']))
+        result.append(f"{sentence['shipname']}")
     if sentence['time']:
         result.append(time_to_text(sentence['time']))
     return " ".join(result)
@@ -259,54 +354,58 @@ def burst(source, dest, verbose):
     """ Takes large AIS files and splits them up by sender. """
     if not dest:
         dest = source
-    writers = {}
+    writers = OrderedDict()  # least recently used first
+    started = set()
     fname, ext = os.path.splitext(dest)
 
     for sentence in sentences_from_source(source, log_errors=verbose):
         mmsi = sentence['mmsi']
         if not mmsi:
             mmsi = 'other'
-        if mmsi not in writers:
-            writers[mmsi] = open("{}-{}{}".format(fname, mmsi, ext), "wt")
+        if mmsi in writers:
+            writers.move_to_end(mmsi)
+        else:
+            # a file we had to close earlier gets appended to, not clobbered
+            mode = "at" if mmsi in started else "wt"
+            started.add(mmsi)
+            writers[mmsi] = open("{}-{}{}".format(fname, mmsi, ext), mode, buffering=_BURST_BUFFER_SIZE,
+                                 encoding="ascii", errors="replace")
+            if len(writers) > _BURST_MAX_OPEN_WRITERS:
+                writers.popitem(last=False)[1].close()
         print_sentence_source(sentence, writers[mmsi])
 
     for writer in writers.values():
         writer.close()
 
 
-class FieldsHistory:
-    def __init__(self):
-        self.values = defaultdict(list)
-
-    def __getitem__(self, key):
-        return self.values[key]
-
-    def __setitem__(self, key, value):
-        value = value.strip()
-        if key and value and len(value) > 0:
-            if value not in (self.values[key]):
-                self.values[key].append(value)
-
-    def __iter__(self):
-        return self.values.__iter__()
-
-
 class SenderInfo:
     def __init__(self):
         self.mmsi = None
         self.sentence_count = 0
         self.type_counts = defaultdict(int)
-        self.fields = FieldsHistory()
+        self.fields = {}
 
     def add(self, sentence):
+        self.add_cached(sentence, sentence.type_id(), sentence['mmsi'])
+
+    def add_cached(self, sentence, tid, mmsi):
+        """Like add(), but with the type id and mmsi already looked up by the caller."""
         if not self.mmsi:
-            self.mmsi = sentence['mmsi']
+            self.mmsi = mmsi
         self.sentence_count += 1
-        self.type_counts[sentence.type_id()] += 1
-        if sentence.type_id() == 5:
-            self.fields['shipname'] = sentence['shipname']
-            self.fields['destination'] = sentence['destination']
-            self.fields['dimensions'] = dimensions_as_text(sentence)
+        self.type_counts[tid] += 1
+        if tid == 5:
+            self._remember('shipname', sentence['shipname'])
+            self._remember('destination', sentence['destination'])
+            self._remember('dimensions', dimensions_as_text(sentence))
+
+    def _remember(self, key, value):
+        if value:
+            value = value.strip()
+            if value:
+                values = self.fields.setdefault(key, [])
+                if value not in values:
+                    values.append(value)
 
     def report(self, file=sys.stdout):
         print("{}:".format(self.mmsi), file=file)
@@ -325,13 +424,17 @@ class MaxMin:
         return self.min is not None and self.min is not None
 
     def add(self, value):
-        if not self.valid():
+        if self.min is None:
             self.min = self.max = value
-            return
-        if value > self.max:
-            self.max = value
-        if value < self.min:
+        elif value < self.min:
             self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def add_all(self, values):
+        if len(values) > 0:
+            self.add(float(values.min()))
+            self.add(float(values.max()))
 
     def range(self):
         if self.valid:
@@ -355,6 +458,10 @@ class GeoInfo:
         self.lon.add(point[0])
         self.lat.add(point[1])
 
+    def add_all(self, lons, lats):
+        self.lon.add_all(lons)
+        self.lat.add_all(lats)
+
     def report(self, indent="", file=sys.stdout):
         if not self.valid():
             return
@@ -398,22 +505,41 @@ def distance(p1, p2):
 
 
 class SentencesInfo:
+    TYPE_BATCH_SIZE = 1 << 16
+
     def __init__(self, by_type=False):
         self.by_type = by_type
         self.sentence_count = 0
         self.bad_checksum_count = 0
         self.time_range = MaxMin()
-        if by_type:
-            self.type_counts = defaultdict(int)
+        # type ids are small ints, so we buffer them as bytes and fold each batch into a histogram with bincount
+        self._tids = array('b')
+        self._type_totals = numpy.zeros(64, dtype=numpy.int64)
         self.sender_counts = defaultdict(int)
 
     def add(self, sentence):
+        self.add_cached(sentence.time, sentence.type_id(), sentence['mmsi'])
+
+    def add_cached(self, time, tid, mmsi):
+        """Like add(), but with the sentence's fields already looked up by the caller."""
         self.sentence_count += 1
-        if sentence.time:
-            self.time_range.add(sentence.time)
+        if time:
+            self.time_range.add(time)
         if self.by_type:
-            self.type_counts[sentence.type_id()] += 1
-        self.sender_counts[sentence['mmsi']] += 1
+            self._tids.append(tid)
+            if len(self._tids) >= self.TYPE_BATCH_SIZE:
+                self._fold_tids()
+        self.sender_counts[mmsi] += 1
+
+    def _fold_tids(self):
+        if len(self._tids) > 0:
+            self._type_totals += numpy.bincount(numpy.frombuffer(self._tids, dtype=numpy.int8), minlength=64)
+            del self._tids[:]
+
+    @property
+    def type_counts(self):
+        self._fold_tids()
+        return {tid: int(count) for tid, count in enumerate(self._type_totals) if count}
 
     def count_bad_checksum(self):
         self.bad_checksum_count += 1
@@ -438,8 +564,8 @@ class SentencesInfo:
         if self.sentence_count > 0:
             if self.by_type:
                 print("   type counts:", file=file)
-                for i in sorted(self.type_counts):
-                    print("                {:2d} {:8d}".format(i, self.type_counts[i]), file=file)
+                for i, count in self.type_counts.items():
+                    print("                {:2d} {:8d}".format(i, count), file=file)
                 print(file=file)
 
 
@@ -452,20 +578,45 @@ class Bucketer:
         self.bucket_count = bucket_count
         self.max_buckets = bucket_count - 1
         if self.min_val == self.max_val:
-            self.bins = numpy.linspace(min_val - 1, max_val + 1, bucket_count + 1)
+            self.low = float(min_val - 1)
+            self.high = float(max_val + 1)
         else:
-            self.bins = numpy.linspace(min_val, max_val + sys.float_info.epsilon, bucket_count + 1)
+            self.low = float(min_val)
+            self.high = float(max_val + sys.float_info.epsilon)
+        # buckets are all the same width, so we can find a value's bucket by scaling instead of searching
+        self._step = (self.high - self.low) / self.bucket_count
+        self._inv_width = self.bucket_count / (self.high - self.low)
+
+    def _edge(self, i):
+        # the same arithmetic numpy.linspace uses, so edges match numpy's exactly
+        if i == self.bucket_count:
+            return self.high
+        return i * self._step + self.low
 
     def bucket(self, value):
-        result = numpy.digitize(value, self.bins) - 1
-
-        # this shouldn't be necessary, but it somehow is
-        if result > self.max_buckets:
-            return self.max_buckets
+        result = int((value - self.low) * self._inv_width)
+        if result < 0:
+            result = 0
+        elif result > self.max_buckets:
+            result = self.max_buckets
+        # scaling can be off by one right next to an edge; like numpy.histogram, check against the real edges
+        if result > 0 and value < self._edge(result):
+            result -= 1
+        elif result < self.max_buckets and value >= self._edge(result + 1):
+            result += 1
         return result
 
+    def bucket_all(self, values):
+        """Like bucket(), but for a whole numpy array of values at once."""
+        guess = numpy.clip((values - self.low) * self._inv_width, 0, self.max_buckets).astype(numpy.intp)
+        edges = numpy.arange(self.bucket_count + 1) * self._step + self.low
+        edges[-1] = self.high
+        down = (guess > 0) & (values < edges[guess])
+        up = ~down & (guess < self.max_buckets) & (values >= edges[guess + 1])
+        return guess - down + up
+
     def __str__(self, *args, **kwargs):
-        return "Bucketer({}, {}, {}, {})".format(self.min_val, self.max_val, self.bucket_count, self.bins)
+        return "Bucketer({}, {}, {}, {}, {})".format(self.min_val, self.max_val, self.bucket_count, self.low, self.high)
 
 
 class DensityMap:
@@ -474,30 +625,49 @@ class DensityMap:
         self.height_scale = height_scale  # terminal characters are about 2x tall as they are wide
         self.indent = indent
         self.geo_info = GeoInfo()
-        self.points = []
+        self._lon_buf = []
+        self._lat_buf = []
+        self._geo_info_stale = False
         self.marks = []
         self.cached_height = None
+        self.cached_counts = None
+        self.lon_bucketer = None
+        self.lat_bucketer = None
 
     def add(self, point):
-        self.points.append(point)
-        self.geo_info.add(point)
-        if self.cached_height is not None:
-            self.cached_height = None
+        self._lon_buf.append(point[0])
+        self._lat_buf.append(point[1])
+        self._geo_info_stale = True
+        self._forget_layout()
+
+    def _forget_layout(self):
+        self.cached_height = None
+        self.cached_counts = None
+
+    def _point_arrays(self):
+        return numpy.asarray(self._lon_buf, dtype=numpy.float64), numpy.asarray(self._lat_buf, dtype=numpy.float64)
+
+    def _refresh_geo_info(self):
+        if self._geo_info_stale:
+            self.geo_info.add_all(*self._point_arrays())
+            self._geo_info_stale = False
 
     def valid(self):
-        return len(self.points) > 0 and self.geo_info.valid()
+        self._refresh_geo_info()
+        return len(self._lon_buf) > 0 and self.geo_info.valid()
 
     def bucket(self, points):
-        xb = Bucketer(self.geo_info.lon.min, self.geo_info.lon.max, self.width())
-        yb = Bucketer(self.geo_info.lat.min, self.geo_info.lat.max, self.height())
+        self.finalize()
+        height = self.height()
         result = []
         for point in points:
-            x = xb.bucket(point[0])
-            y = self.height() - 1 - yb.bucket(point[1])
+            x = self.lon_bucketer.bucket(point[0])
+            y = height - 1 - self.lat_bucketer.bucket(point[1])
             result.append((x, y))
         return result
 
     def height(self):
+        self._refresh_geo_info()
         if self.cached_height is None:
             if self.geo_info.valid() and self.geo_info.width() > 0 and self.geo_info.height() > 0:
                 self.cached_height = int(
@@ -509,40 +679,48 @@ class DensityMap:
     def width(self):
         return self.desired_width
 
+    def finalize(self):
+        """Works out bounds, buckets, and counts; they're kept until more points are added."""
+        if self.cached_counts is not None:
+            return self.cached_counts
+        self._refresh_geo_info()
+        if not self.geo_info.valid():
+            self.cached_counts = numpy.zeros((self.height(), self.width()), dtype=int)
+            return self.cached_counts
+        self.lon_bucketer = Bucketer(self.geo_info.lon.min, self.geo_info.lon.max, self.width())
+        self.lat_bucketer = Bucketer(self.geo_info.lat.min, self.geo_info.lat.max, self.height())
+        lons, lats = self._point_arrays()
+        height = self.height()
+        width = self.width()
+        # same bucketing as marks get, so a mark always lands in the cell of a point at its location
+        xs = self.lon_bucketer.bucket_all(lons)
+        ys = height - 1 - self.lat_bucketer.bucket_all(lats)
+        counts = numpy.bincount(ys * width + xs, minlength=height * width)
+        self.cached_counts = counts.reshape(height, width).astype(int)
+        for x, y in self.bucket(self.marks):
+            self.cached_counts[y, x] = -1
+        return self.cached_counts
+
     def to_counts(self):
-        # noinspection PyUnusedLocal
-        results = [[0 for ignored in range(self.width())] for ignored in range(self.height())]
-        if self.geo_info.valid():
-            for x, y in self.bucket(self.points):
-                results[y][x] += 1
-            for x, y in self.bucket(self.marks):
-                results[y][x] = -1
-        return results
+        return self.finalize().copy()
 
-    def to_text(self):
-        counts = self.to_counts()
+    # indexed by cell code: -1 for marks, 0 for empty, 1 + scaled count otherwise
+    _CELL_TEXT = numpy.frombuffer(b"* .123456789", dtype=numpy.uint8)
 
-        max_count = max([max(l) for l in counts])
+    def to_text(self):
+        counts = self.finalize()
 
-        def value_to_text(value):
-            if value == -1:
-                return "*"
-            elif value == 0:
-                return " "
-            else:
-                c = str(int(9.99999 * value / max_count))
-                if c == '0':
-                    return '.'
-                return c
+        max_count = counts.max()
+        codes = numpy.where(counts < 0, -1, numpy.sign(counts))
+        if max_count > 0:
+            codes += (counts * (9.99999 / max_count)).astype(int).clip(min=0)
+        cells = self._CELL_TEXT[codes + 1]
 
         output = []
         header_footer_line = "{}+{}+".format(self.indent, "-" * self.width())
         output.append(header_footer_line)
-        for row in counts:
-            line = []
-            for col in row:
-                line.append(value_to_text(col))
-            output.append("{}|{}|".format(self.indent, "".join(line)))
+        for row in cells:
+            output.append("{}|{}|".format(self.indent, row.tobytes().decode("ascii")))
         output.append(header_footer_line)
         return output
 
@@ -552,6 +730,7 @@ class DensityMap:
     def mark(self, point):
         self.marks.append(point)
         self.geo_info.add(point)
+        self._forget_layout()
 
 
 @click.command()
@@ -578,7 +757,9 @@ def info(sources, individual, by_type, show_map, point, verbose):
                 sentences_info.count_bad_checksum()
                 continue
 
-            sentences_info.add(sentence)
+            tid = sentence.type_id()
+            mmsi = sentence['mmsi']
+            sentences_info.add_cached(sentence.time, tid, mmsi)
 
             loc = sentence.location()
             if loc:
@@ -587,7 +768,7 @@ def info(sources, individual, by_type, show_map, point, verbose):
                     map_info.add(loc)
 
             if individual:
-                sender_info[sentence['mmsi']].add(sentence)
+                sender_info[mmsi].add_cached(sentence, tid, mmsi)
         except:
             print("Unexpected failure for sentence", sentence.text, file=sys.stderr)
             raise
@@ -606,12 +787,6 @@ def info(sources, individual, by_type, show_map, point, verbose):
                 sender_info[mmsi].report(file=sys.stdout)
 
 
-def chunks(l, n):
-    # Yield successive n-sized chunks from l.
-    for i in range(0, len(l), n):
-        yield l[i:i + n]
-
-
 @click.command()
 @click.argument('sources', nargs=-1)
 @click.option('--bits', '-b', is_flag=True)
@@ -628,17 +803,16 @@ def dump(sources, bits, verbose):
             if sentence.time:
                 print("          time: {}".format(time_to_text(sentence.time)))
             for t in sentence.text:
-                print("          text: {}".format(re.search("!.*", t).group(0)))
+                print("          text: !{}".format(t.partition("!")[2]))
             print("        length: {}".format(len(sentence.message_bits())))
             if bits:
-                bit_lumps = list(chunks(str(sentence.message_bits()), 6))
-                groups = chunks(bit_lumps, 8)
-                pos = 0
+                bit_text = str(sentence.message_bits())
                 print("         check: {}".format(", ".join([str(c) for c in sentence.fragment_checksum_validity()])))
-                print("          bits: {:3d} {}".format(pos, " ".join(groups.__next__())))
-                for group in groups:
-                    pos += 48
-                    print("          bits: {:3d} {}".format(pos, " ".join(group)))
+                # 8 groups of 6 bits, one per payload character, on each line
+                for pos in range(0, len(bit_text), 48):
+                    line = bit_text[pos:pos + 48]
+                    lumps = [line[i:i + 6] for i in range(0, len(line), 6)]
+                    print("          bits: {:3d} {}".format(pos, " ".join(lumps)))
 
             for field in sentence.fields():
                 value = '-'
@@ -805,12 +979,15 @@ class RefineFilter:
 @click.argument('sources', nargs=-1)
 def refine(sources):
     filters = defaultdict(RefineFilter)
+    _stdout_lines.live = sources_are_live(sources)
     for sentence in sentences_from_sources(sources):
         with wild_disregard_for(BrokenPipeError):
             filter = filters[sentence['mmsi']]
             if filter.wants(sentence):
                 print_sentence_source(sentence)
                 filter.mark(sentence)
+    with wild_disregard_for(BrokenPipeError):
+        _stdout_lines.flush()
 
 
 @click.command()
@@ -1,4 +1,6 @@
+import io
 from unittest import TestCase
+from unittest.mock import patch
 
 from simpleais import parse
 from simpleais.tools import *
@@ -32,6 +34,50 @@ class TestGeoInfo(TestCase):
         # TODO: test an area that is more than half the earth
 
 
+class TestSenderInfo(TestCase):
+    type_5 = parse(["!WSVDM,2,1,0,A,5=JklSl00003UHDs:20l4E9<f04i@4U:22222217,0*4C",
+                    "!WSVDM,2,2,0,A,05B0dl0HtS000000000000000000008,2*00"])[0]
+
+    def test_fields_skip_blanks_and_repeats(self):
+        s = SenderInfo()
+        s.add(self.type_5)
+        s.add(self.type_5)
+        self.assertEqual(2, s.sentence_count)
+        self.assertEqual({'shipname': ['MAERSK ALTAIR']}, s.fields)
+
+
+class TestMaxMin(TestCase):
+    def test_add_all(self):
+        m = MaxMin()
+        m.add(2)
+        m.add_all(numpy.array([3.5, -1.0, 0.5]))
+        self.assertEqual(-1.0, m.min)
+        self.assertEqual(3.5, m.max)
+
+    def test_add_all_empty(self):
+        m = MaxMin()
+        m.add_all(numpy.array([]))
+        self.assertFalse(m.valid())
+
+
+class TestSentencesInfo(TestCase):
+    def test_counts(self):
+        i = SentencesInfo(by_type=True)
+        i.add_cached(None, 1, '366985310')
+        i.add_cached(None, 5, '366985310')
+        i.add_cached(None, 1, '338063456')
+        self.assertEqual(3, i.sentence_count)
+        self.assertEqual({1: 2, 5: 1}, i.type_counts)
+        self.assertEqual({'366985310': 2, '338063456': 1}, i.sender_counts)
+
+    def test_type_counts_across_batches(self):
+        i = SentencesInfo(by_type=True)
+        i.TYPE_BATCH_SIZE = 2
+        for tid in [1, 1, 5, 18, 1]:
+            i.add_cached(None, tid, '366985310')
+        self.assertEqual({1: 3, 5: 1, 18: 1}, i.type_counts)
+
+
 class TestDensityMap(TestCase):
     def test_empty(self):
         m = DensityMap(3, height_scale=1)
@@ -204,6 +250,35 @@ class TestDensityMap(TestCase):
             '+---+',
         ], m.to_text())
 
+    def test_adding_after_rendering(self):
+        m = DensityMap(3, height_scale=1)
+        m.add((0, 0))
+        m.to_text()
+        m.add((1, 1))
+        self.assertListEqual([
+            '+---+',
+            '|  9|',
+            '|   |',
+            '|9  |',
+            '+---+',
+        ], m.to_text())
+
+    def test_changing_counts_leaves_map_alone(self):
+        m = DensityMap(3, height_scale=1)
+        m.add((0, 0))
+        m.to_counts()[1, 1] = 0
+        self.assertEqual('| 9 |', m.to_text()[2])
+
+    def test_mark_on_a_point_covers_it(self):
+        m = DensityMap(60, height_scale=0.1)
+        m.add((-119.0016, 0.0))
+        m.add((-118.3846, 1.0))
+        m.add((-118.7548, 0.5))
+        m.mark((-118.7548, 0.5))
+        middle = [line for line in m.to_text() if '*' in line]
+        self.assertEqual(1, len(middle))
+        self.assertEqual('*', middle[0].strip('|').strip())
+
     def test_funky_example_1(self):
         m = DensityMap(4, height_scale=1)
         m.add((-118.4680, 33.7419))
@@ -243,6 +318,16 @@ class TestBucketer(TestCase):
         self.assertEqual(0, b.bucket(33.7415))
         self.assertEqual(3, b.bucket(33.7419))
 
+    def test_bucket_all_matches_bucket(self):
+        b = Bucketer(-119.0016, -118.3846, 60)
+        values = numpy.array([-119.0016, -118.7548, -118.5, -118.3846, -120.0, -118.0])
+        self.assertListEqual([b.bucket(v) for v in values], list(b.bucket_all(values)))
+
+    def test_value_on_a_bin_edge(self):
+        # scaling alone puts this in bucket 23, but it sits exactly on the edge that starts bucket 24
+        b = Bucketer(-119.0016, -118.3846, 60)
+        self.assertEqual(24, b.bucket(-118.7548))
+
     def test_bins(self):
         """
          Left as an explanation of how numpy binning works.Basically, you need
@@ -284,6 +369,17 @@ class TestTaster(TestCase):
         self.assertTrue(taster.likes(self.type_1_la))
         self.assertFalse(taster.likes(self.type_1_sf))
 
+    def test_combined_location_filtering(self):
+        taster = Taster(lat=(32, 35), lon=(-123, -122))  # LA latitude, SF longitude
+        self.assertFalse(taster.likes(self.type_1_la))
+        self.assertFalse(taster.likes(self.type_1_sf))
+        self.assertFalse(taster.likes(self.type_5))
+
+        taster = Taster(lat=(32, 35), lon=(-123, -122), mode='or')
+        self.assertTrue(taster.likes(self.type_1_la))
+        self.assertTrue(taster.likes(self.type_1_sf))
+        self.assertFalse(taster.likes(self.type_5))
+
     def test_type_filtering(self):
         taster = Taster(sentence_type=[1])
         self.assertTrue(taster.likes(self.type_1_la))
@@ -378,6 +474,79 @@ class CommandLineSmokeTest(TestCase):
             return [file]
 
 
+class TestBurst(TestCase):
+    lines = ["1452468552.938 !AIVDM,1,1,,B,14Wtnn002SGLde:BbrBmdTLF0Vql,0*6E",
+             "!AIVDM,1,1,,A,15Mw0GP01SG?W>PE`laU<TJj0L20,0*67",
+             "1452468553.938 !AIVDM,1,1,,B,14Wtnn002SGLde:BbrBmdTLF0Vql,0*6E"]
+
+    def test_reopened_writers_append(self):
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            with open('example.ais', 'w') as f:
+                f.write("\n".join(self.lines))
+            with patch('simpleais.tools._BURST_MAX_OPEN_WRITERS', 1):
+                result = runner.invoke(burst, ['example.ais', 'out.ais'])
+            self.assertEqual(0, result.exit_code)
+            with open('out-{}.ais'.format(parse(self.lines[0])['mmsi'])) as f:
+                self.assertEqual([self.lines[0], self.lines[2]], f.read().splitlines())
+            with open('out-{}.ais'.format(parse(self.lines[1])['mmsi'])) as f:
+                self.assertEqual([self.lines[1]], f.read().splitlines())
+
+
+class FakeStdout(io.StringIO):
+    def __init__(self, tty):
+        super().__init__()
+        self.tty = tty
+        self.flushes = 0
+
+    def isatty(self):
+        return self.tty
+
+    def flush(self):
+        self.flushes += 1
+
+
+class TestLineBatcher(TestCase):
+    def test_terminal_flushes_every_line(self):
+        batcher = LineBatcher(lines_per_flush=3, seconds_per_flush=60)
+        with patch('sys.stdout', FakeStdout(tty=True)) as out:
+            batcher.print("a")
+            batcher.print("b")
+        self.assertEqual("a\nb\n", out.getvalue())
+        self.assertEqual(2, out.flushes)
+
+    def test_pipe_flushes_in_batches(self):
+        batcher = LineBatcher(lines_per_flush=3, seconds_per_flush=60)
+        with patch('sys.stdout', FakeStdout(tty=False)) as out:
+            for line in "abcd":
+                batcher.print(line)
+            self.assertEqual(1, out.flushes)
+            batcher.flush()
+        self.assertEqual("a\nb\nc\nd\n", out.getvalue())
+        self.assertEqual(2, out.flushes)
+
+    def test_pipe_flushes_after_a_quiet_spell(self):
+        batcher = LineBatcher(lines_per_flush=3, seconds_per_flush=1)
+        with patch('sys.stdout', FakeStdout(tty=False)) as out:
+            with patch('simpleais.tools.monotonic', return_value=batcher.last_flush + 2):
+                batcher.print("a")
+        self.assertEqual(1, out.flushes)
+
+    def test_live_source_flushes_every_line(self):
+        batcher = LineBatcher(lines_per_flush=3, seconds_per_flush=60)
+        batcher.live = True
+        with patch('sys.stdout', FakeStdout(tty=False)) as out:
+            batcher.print("a")
+        self.assertEqual(1, out.flushes)
+
+    def test_sources_are_live(self):
+        self.assertTrue(sources_are_live(["/dev/ttyUSB0"]))
+        self.assertTrue(sources_are_live(["sample.ais", "http://example.com/ais"]))
+        self.assertFalse(sources_are_live(["sample.ais"]))
+        with open(__file__) as f, patch('sys.stdin', f):
+            self.assertFalse(sources_are_live([]))
+
+
 class TestRefineFilter(TestCase):
 
     def test_angle_difference(self):